@@ -1,11 +1,47 @@
-import json
 import os
-from datetime import datetime
+import sys
+from collections import defaultdict
+from functools import lru_cache
+from operator import itemgetter
 from pathlib import Path
 from typing import Optional
 
+import orjson
+
+from battle_utils import calculate_win_rate, format_battle_time, locate_player
+
 
 MONITORING_DIR = Path(__file__).parent / "monitoring"
+MAX_BATTLES = 100  # Battles kept per player file
+OPPONENT_HISTORY_LIMIT = 10  # Recent battles kept per opponent
+
+# Which battle fields a _MODE_RULES needle is matched against
+_IN_TYPE = 1
+_IN_MODE = 2
+
+# (needle, fields, category), checked in order; the first match wins
+_MODE_RULES = (
+    ("2v2", _IN_TYPE | _IN_MODE, "2v2"),
+    ("friendly", _IN_TYPE | _IN_MODE, "Friendly"),
+    ("challenge", _IN_TYPE | _IN_MODE, "Challenge"),
+    ("tournament", _IN_TYPE | _IN_MODE, "Tournament"),
+    ("clanwar", _IN_TYPE | _IN_MODE, "Clan War"),
+    ("war", _IN_MODE, "Clan War"),
+    ("party", _IN_MODE, "Party Mode"),
+    # Ladder (Path of Legends / Trophy Road)
+    ("pathoflegend", _IN_TYPE, "Ladder"),
+    ("ladder", _IN_TYPE, "Ladder"),
+)
+
+# Counter incremented for each battle result
+_RESULT_KEYS = {"win": "wins", "loss": "losses", "draw": "draws"}
+
+# Battle fields drawn from a small set of values, interned so the copies
+# across a player's battles share one string object
+_INTERNED_FIELDS = ("result", "game_mode_category", "game_mode", "type", "arena")
+
+# Parsed player files, keyed by path: {filepath: (st_mtime_ns, data)}
+_CACHE: dict[Path, tuple[int, dict]] = {}
 
 
 def ensure_monitoring_dir():
@@ -13,95 +49,107 @@ def ensure_monitoring_dir():
     MONITORING_DIR.mkdir(exist_ok=True)
 
 
+# Create the directory once up front instead of on every save
+ensure_monitoring_dir()
+
+
 def get_player_file(player_tag: str) -> Path:
     """Get the battle log file path for a player"""
-    clean_tag = player_tag.replace("#", "").upper()
+    return _player_file(player_tag.replace("#", "").upper())
+
+
+@lru_cache(maxsize=512)
+def _player_file(clean_tag: str) -> Path:
+    """Build (and memoize) the battle log path for a cleaned tag"""
     return MONITORING_DIR / f"{clean_tag}.json"
 
 
 def load_player_data(player_tag: str) -> dict:
-    """Load player battle data from file"""
+    """Load player battle data from file.
+
+    Only the battle list is stored on disk; stats and opponent_stats are
+    derived from it here. Parsed data is cached until the file's mtime
+    changes, so the returned dict is shared: callers that modify it must
+    pass it to save_player_data.
+    """
     filepath = get_player_file(player_tag)
-    if filepath.exists():
-        with open(filepath, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {
-        "player_tag": player_tag,
-        "battles": [],
-        "stats": {},
-        "opponent_stats": {}
-    }
+    try:
+        mtime = filepath.stat().st_mtime_ns
+    except FileNotFoundError:
+        return _with_stats({"player_tag": player_tag, "battles": []})
 
+    cached = _CACHE.get(filepath)
+    if cached and cached[0] == mtime:
+        return cached[1]
 
-def save_player_data(player_tag: str, data: dict):
-    """Save player battle data to file"""
-    ensure_monitoring_dir()
-    filepath = get_player_file(player_tag)
-    with open(filepath, "w", encoding="utf-8") as f:
-        json.dump(data, f, indent=2, ensure_ascii=False)
+    # Read the whole file and parse the raw bytes in one go
+    with open(filepath, "rb") as f:
+        data = orjson.loads(f.read())
 
+    # Files written before the compact format also carry stored stats; those
+    # are ignored and rebuilt from the battles
+    battles = data.get("battles", [])
+    for battle in battles:
+        _intern_fields(battle)
 
-def categorize_game_mode(battle: dict) -> str:
-    """Categorize a battle into a game mode category"""
-    battle_type = battle.get("type", "").lower()
-    game_mode = battle.get("gameMode", {}).get("name", "").lower()
+    data = _with_stats({
+        "player_tag": data.get("player_tag", player_tag),
+        "battles": battles
+    })
+    _CACHE[filepath] = (mtime, data)
+    return data
 
-    # Check for 2v2
-    if "2v2" in game_mode or "2v2" in battle_type:
-        return "2v2"
 
-    # Check for friendly battles
-    if "friendly" in battle_type or "friendly" in game_mode:
-        return "Friendly"
+def _intern_fields(battle_info: dict) -> dict:
+    """Intern the low-cardinality string fields of a logged battle"""
+    for key in _INTERNED_FIELDS:
+        value = battle_info.get(key)
+        if isinstance(value, str):
+            battle_info[key] = sys.intern(value)
+    return battle_info
 
-    # Check for challenges
-    if "challenge" in battle_type or "challenge" in game_mode:
-        return "Challenge"
 
-    # Check for tournaments
-    if "tournament" in battle_type or "tournament" in game_mode:
-        return "Tournament"
+def _with_stats(data: dict) -> dict:
+    """Attach the stats derived from a player's battle list"""
+    data["stats"], data["opponent_stats"] = _recalculate_all(data["battles"])
+    return data
 
-    # Check for clan war
-    if "clanwar" in battle_type or "war" in game_mode or "clanwar" in game_mode:
-        return "Clan War"
 
-    # Check for party modes
-    if "party" in game_mode:
-        return "Party Mode"
+def save_player_data(player_tag: str, data: dict):
+    """Save player battle data to file (only the battle list is persisted)"""
+    filepath = get_player_file(player_tag)
+    # Serialize straight to UTF-8 bytes in one shot
+    payload = orjson.dumps(
+        {"player_tag": data["player_tag"], "battles": data["battles"]},
+        option=orjson.OPT_INDENT_2 | orjson.OPT_APPEND_NEWLINE
+    )
 
-    # Check for ladder (Path of Legends / Trophy Road)
-    if "pathoflegend" in battle_type or "ladder" in battle_type:
-        return "Ladder"
+    # Write to a temp file and swap it in, so a crash never leaves a partial file
+    tmp_path = filepath.with_suffix(".json.tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(payload)
+    os.replace(tmp_path, filepath)
+    _CACHE[filepath] = (filepath.stat().st_mtime_ns, data)
 
-    # Default to the game mode name or 1v1
-    if game_mode:
-        # Capitalize properly
-        return battle.get("gameMode", {}).get("name", "1v1")
 
-    return "1v1"
+def categorize_game_mode(battle: dict) -> str:
+    """Categorize a battle into a game mode category"""
+    battle_type = battle.get("type", "").lower()
+    game_mode_name = battle.get("gameMode", {}).get("name", "")
+    game_mode = game_mode_name.lower()
 
+    for needle, fields, category in _MODE_RULES:
+        if (fields & _IN_TYPE and needle in battle_type) or (fields & _IN_MODE and needle in game_mode):
+            return category
 
-def determine_battle_result(battle: dict, player_tag: str) -> str:
-    """Determine if the player won, lost, or drew"""
-    team = battle.get("team", [])
-    opponent = battle.get("opponent", [])
+    # Default to the game mode name or 1v1
+    return game_mode_name or "1v1"
 
-    player_crowns = 0
-    enemy_crowns = 0
 
-    # Find player in team or opponent
-    for t in team:
-        if t.get("tag", "").upper() == player_tag.upper():
-            player_crowns = t.get("crowns", 0)
-            enemy_crowns = opponent[0].get("crowns", 0) if opponent else 0
-            break
-    else:
-        for o in opponent:
-            if o.get("tag", "").upper() == player_tag.upper():
-                player_crowns = o.get("crowns", 0)
-                enemy_crowns = team[0].get("crowns", 0) if team else 0
-                break
+def _result_for(player_data: Optional[dict], enemy_data: dict) -> str:
+    """Determine the result for a located player (a draw if not found)"""
+    player_crowns = player_data.get("crowns", 0) if player_data else 0
+    enemy_crowns = enemy_data.get("crowns", 0)
 
     if player_crowns > enemy_crowns:
         return "win"
@@ -111,220 +159,239 @@ def determine_battle_result(battle: dict, player_tag: str) -> str:
         return "draw"
 
 
+def determine_battle_result(battle: dict, player_tag: str) -> str:
+    """Determine if the player won, lost, or drew"""
+    player_data, enemy_data = locate_player(
+        battle.get("team", []), battle.get("opponent", []), player_tag.upper()
+    )
+    return _result_for(player_data, enemy_data)
+
+
+def _deck_names(cards) -> list:
+    """Get the card names of a deck (first 8 cards)"""
+    return [c["name"] if "name" in c else "?" for c in cards[:8]]
+
+
 def extract_battle_info(battle: dict, player_tag: str) -> dict:
     """Extract relevant battle information for logging"""
     team = battle.get("team", [])
     opponent = battle.get("opponent", [])
 
-    player_data = None
-    enemy_data = None
-
-    for t in team:
-        if t.get("tag", "").upper() == player_tag.upper():
-            player_data = t
-            enemy_data = opponent[0] if opponent else {}
-            break
-
-    if not player_data:
-        for o in opponent:
-            if o.get("tag", "").upper() == player_tag.upper():
-                player_data = o
-                enemy_data = team[0] if team else {}
-                break
+    player_data, enemy_data = locate_player(team, opponent, player_tag.upper())
+    result = _result_for(player_data, enemy_data)
 
     if not player_data:
         player_data = team[0] if team else {}
         enemy_data = opponent[0] if opponent else {}
 
     battle_time = battle.get("battleTime", "")
-    try:
-        dt = datetime.strptime(battle_time, "%Y%m%dT%H%M%S.%fZ")
-        time_str = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
-    except:
-        time_str = battle_time
 
-    return {
+    return _intern_fields({
         "battle_time": battle_time,
-        "time_formatted": time_str,
+        "time_formatted": format_battle_time(battle_time),
         "game_mode": battle.get("gameMode", {}).get("name", "Unknown"),
         "game_mode_category": categorize_game_mode(battle),
         "type": battle.get("type", "Unknown"),
         "arena": battle.get("arena", {}).get("name", "Unknown"),
-        "result": determine_battle_result(battle, player_tag),
+        "result": result,
         "player": {
             "name": player_data.get("name", "Unknown"),
             "tag": player_data.get("tag", ""),
             "crowns": player_data.get("crowns", 0),
             "trophies": player_data.get("startingTrophies", 0),
             "trophy_change": player_data.get("trophyChange", 0),
-            "deck": [c.get("name", "?") for c in player_data.get("cards", [])[:8]]
+            "deck": _deck_names(player_data.get("cards") or ())
         },
         "enemy": {
             "name": enemy_data.get("name", "Unknown"),
             "tag": enemy_data.get("tag", ""),
             "crowns": enemy_data.get("crowns", 0),
             "trophies": enemy_data.get("startingTrophies", 0),
-            "deck": [c.get("name", "?") for c in enemy_data.get("cards", [])[:8]]
+            "deck": _deck_names(enemy_data.get("cards") or ())
         }
-    }
+    })
 
 
-def add_battle(player_tag: str, battle: dict) -> dict:
-    """Add a battle to the player's log and return updated stats"""
+def add_battle(player_tag: str, battle: dict) -> tuple[dict, Optional[dict]]:
+    """Add a battle to the player's log and return (stats, opponent history)"""
     data = load_player_data(player_tag)
 
     battle_info = extract_battle_info(battle, player_tag)
 
     # Check if battle already exists (by battle_time)
-    existing_times = [b.get("battle_time") for b in data["battles"]]
+    existing_times = {b.get("battle_time") for b in data["battles"]}
+    # A duplicate battle leaves the stored data untouched, so skip the write
     if battle_info["battle_time"] not in existing_times:
         data["battles"].append(battle_info)
-        # Keep only last 100 battles to avoid file bloat
-        data["battles"] = data["battles"][-100:]
+        # Keep only the most recent battles to avoid file bloat; stats are
+        # additive, so only the changed battles need to be applied
+        if len(data["battles"]) > MAX_BATTLES:
+            for old_battle in data["battles"][:-MAX_BATTLES]:
+                _update_stats(data["stats"], old_battle, -1)
+                _update_opponent_stats(data["opponent_stats"], old_battle, -1)
+            del data["battles"][:-MAX_BATTLES]
+        _update_stats(data["stats"], battle_info, 1)
+        _update_opponent_stats(data["opponent_stats"], battle_info, 1)
 
-    # Recalculate stats
-    data["stats"] = calculate_stats(data["battles"])
-    data["opponent_stats"] = calculate_opponent_stats(data["battles"])
+        save_player_data(player_tag, data)
 
-    save_player_data(player_tag, data)
-    return data["stats"]
+    enemy_tag = battle_info.get("enemy", {}).get("tag", "").upper()
+    return data["stats"], data["opponent_stats"].get(enemy_tag)
 
 
-def calculate_stats(battles: list) -> dict:
-    """Calculate win/loss statistics per game mode"""
-    stats = {
-        "total": {"wins": 0, "losses": 0, "draws": 0, "total": 0},
-        "by_mode": {}
-    }
+def _count_result(counts: dict, result: str, step: int = 1):
+    """Add (step=1) or remove (step=-1) a single result from a counts bucket"""
+    counts["total"] += step
+    key = _RESULT_KEYS.get(result)
+    if key:
+        counts[key] += step
 
-    for battle in battles:
-        result = battle.get("result", "unknown")
-        mode = battle.get("game_mode_category", "Unknown")
 
-        # Initialize mode stats if needed
-        if mode not in stats["by_mode"]:
-            stats["by_mode"][mode] = {"wins": 0, "losses": 0, "draws": 0, "total": 0}
-
-        # Update counts
-        stats["total"]["total"] += 1
-        stats["by_mode"][mode]["total"] += 1
-
-        if result == "win":
-            stats["total"]["wins"] += 1
-            stats["by_mode"][mode]["wins"] += 1
-        elif result == "loss":
-            stats["total"]["losses"] += 1
-            stats["by_mode"][mode]["losses"] += 1
-        elif result == "draw":
-            stats["total"]["draws"] += 1
-            stats["by_mode"][mode]["draws"] += 1
-
-    # Calculate win rates
-    if stats["total"]["total"] > 0:
-        stats["total"]["win_rate"] = round(stats["total"]["wins"] / stats["total"]["total"] * 100, 1)
+def _apply_mode_result(by_mode: dict, mode: str, result: str, step: int):
+    """Apply a result to a per-mode bucket, dropping buckets that become empty"""
+    mode_stats = by_mode.get(mode)
+    if mode_stats is None:
+        mode_stats = by_mode[mode] = _new_counts()
+
+    _count_result(mode_stats, result, step)
+    if mode_stats["total"] <= 0:
+        del by_mode[mode]
+
+
+def _update_stats(stats: dict, battle: dict, step: int):
+    """Incrementally add or remove one battle from the overall stats"""
+    result = battle.get("result", "unknown")
+    mode = battle.get("game_mode_category", "Unknown")
+
+    _count_result(stats["total"], result, step)
+    _apply_mode_result(stats["by_mode"], mode, result, step)
+
+
+def _update_opponent_stats(opponents: dict, battle: dict, step: int):
+    """Incrementally add or remove one battle from the per-opponent stats"""
+    enemy = battle.get("enemy", {})
+    enemy_tag = enemy.get("tag", "").upper()
+
+    if not enemy_tag:
+        return
+
+    result = battle.get("result", "unknown")
+    mode = battle.get("game_mode_category", "Unknown")
+
+    if step > 0:
+        if enemy_tag not in opponents:
+            opponents[enemy_tag] = _new_opponent(enemy_tag)
+        opp = opponents[enemy_tag]
+        opp["name"] = enemy.get("name", "Unknown")
+        opp["battles"].append(_opponent_battle_entry(battle, result, mode))
+        del opp["battles"][:-OPPONENT_HISTORY_LIMIT]
     else:
-        stats["total"]["win_rate"] = 0.0
+        opp = opponents.get(enemy_tag)
+        if opp is None:
+            return
+        # Evicted battles are the oldest recorded, so they are only still in
+        # the capped history if every battle against this opponent is
+        if len(opp["battles"]) >= opp["total"]:
+            del opp["battles"][0]
 
-    for mode in stats["by_mode"]:
-        mode_stats = stats["by_mode"][mode]
-        if mode_stats["total"] > 0:
-            mode_stats["win_rate"] = round(mode_stats["wins"] / mode_stats["total"] * 100, 1)
-        else:
-            mode_stats["win_rate"] = 0.0
+    _count_result(opp, result, step)
+    _apply_mode_result(opp["by_mode"], mode, result, step)
+    if opp["total"] <= 0:
+        del opponents[enemy_tag]
 
-    return stats
 
+def _new_counts() -> dict:
+    """Create an empty win/loss/draw counts bucket"""
+    return {"wins": 0, "losses": 0, "draws": 0, "total": 0}
 
-def calculate_opponent_stats(battles: list) -> dict:
-    """Calculate statistics per opponent (for tracking repeat matchups)"""
+
+def _new_opponent(enemy_tag: str) -> dict:
+    """Create an empty stats entry for an opponent"""
+    return {
+        "name": "Unknown",
+        "tag": enemy_tag,
+        "wins": 0,
+        "losses": 0,
+        "draws": 0,
+        "total": 0,
+        "by_mode": {},
+        "battles": []
+    }
+
+
+def _opponent_battle_entry(battle: dict, result: str, mode: str) -> dict:
+    """Build the battle reference stored in an opponent's history"""
+    return {
+        "time": battle.get("battle_time", ""),
+        "time_formatted": battle.get("time_formatted", ""),
+        "result": result,
+        "mode": mode,
+        "player_crowns": battle.get("player", {}).get("crowns", 0),
+        "enemy_crowns": battle.get("enemy", {}).get("crowns", 0)
+    }
+
+
+def _recalculate_all(battles: list) -> tuple[dict, dict]:
+    """Calculate overall and per-opponent stats in a single pass over battles"""
+    total = _new_counts()
+    by_mode = defaultdict(_new_counts)
     opponents = {}
 
     for battle in battles:
+        result = battle.get("result", "unknown")
+        mode = battle.get("game_mode_category", "Unknown")
+
+        # Overall and per-mode counts
+        _count_result(total, result)
+        _count_result(by_mode[mode], result)
+
+        # Per-opponent counts (for tracking repeat matchups)
         enemy = battle.get("enemy", {})
         enemy_tag = enemy.get("tag", "").upper()
-        enemy_name = enemy.get("name", "Unknown")
-
         if not enemy_tag:
             continue
 
-        # Initialize opponent stats if needed
-        if enemy_tag not in opponents:
-            opponents[enemy_tag] = {
-                "name": enemy_name,
-                "tag": enemy_tag,
-                "wins": 0,
-                "losses": 0,
-                "draws": 0,
-                "total": 0,
-                "by_mode": {},
-                "battles": []
-            }
+        opp = opponents.get(enemy_tag)
+        if opp is None:
+            opp = opponents[enemy_tag] = _new_opponent(enemy_tag)
+            opp["by_mode"] = defaultdict(_new_counts)
 
-        opp = opponents[enemy_tag]
-        opp["name"] = enemy_name  # Update name in case it changed
-        opp["total"] += 1
+        opp["name"] = enemy.get("name", "Unknown")  # Update name in case it changed
+        _count_result(opp, result)
+        _count_result(opp["by_mode"][mode], result)
 
-        result = battle.get("result", "unknown")
-        if result == "win":
-            opp["wins"] += 1
-        elif result == "loss":
-            opp["losses"] += 1
-        elif result == "draw":
-            opp["draws"] += 1
-
-        # Track by game mode
-        mode = battle.get("game_mode_category", "Unknown")
-        if mode not in opp["by_mode"]:
-            opp["by_mode"][mode] = {"wins": 0, "losses": 0, "draws": 0, "total": 0}
-
-        opp["by_mode"][mode]["total"] += 1
-        if result == "win":
-            opp["by_mode"][mode]["wins"] += 1
-        elif result == "loss":
-            opp["by_mode"][mode]["losses"] += 1
-        elif result == "draw":
-            opp["by_mode"][mode]["draws"] += 1
-
-        # Store battle reference (time and result for history)
-        opp["battles"].append({
-            "time": battle.get("battle_time", ""),
-            "time_formatted": battle.get("time_formatted", ""),
-            "result": result,
-            "mode": mode,
-            "player_crowns": battle.get("player", {}).get("crowns", 0),
-            "enemy_crowns": enemy.get("crowns", 0)
-        })
-
-    # Calculate win rates for each opponent
-    for tag, opp in opponents.items():
-        if opp["total"] > 0:
-            opp["win_rate"] = round(opp["wins"] / opp["total"] * 100, 1)
-        else:
-            opp["win_rate"] = 0.0
-
-        # Calculate win rates by mode
-        for mode, mode_stats in opp["by_mode"].items():
-            if mode_stats["total"] > 0:
-                mode_stats["win_rate"] = round(mode_stats["wins"] / mode_stats["total"] * 100, 1)
-            else:
-                mode_stats["win_rate"] = 0.0
-
-    return opponents
+        # Store battle reference (time and result for recent history)
+        opp["battles"].append(_opponent_battle_entry(battle, result, mode))
+        del opp["battles"][:-OPPONENT_HISTORY_LIMIT]
+
+    # Convert back to plain dicts so the stored JSON stays the same
+    for opp in opponents.values():
+        opp["by_mode"] = dict(opp["by_mode"])
+
+    return {"total": total, "by_mode": dict(by_mode)}, opponents
+
+
+def calculate_stats(battles: list) -> dict:
+    """Calculate win/loss statistics per game mode"""
+    return _recalculate_all(battles)[0]
+
+
+def calculate_opponent_stats(battles: list) -> dict:
+    """Calculate statistics per opponent (for tracking repeat matchups)"""
+    return _recalculate_all(battles)[1]
 
 
 def get_repeat_opponents(player_tag: str, min_matches: int = 2) -> list:
     """Get opponents faced multiple times, sorted by number of matches"""
-    data = load_player_data(player_tag)
-    opponent_stats = data.get("opponent_stats", {})
-
-    # Filter to opponents with at least min_matches
+    # Per-opponent totals are kept up to date as battles are added, so this is
+    # just a filter over the aggregate
     repeat_opponents = [
-        opp for opp in opponent_stats.values()
-        if opp.get("total", 0) >= min_matches
+        opp for opp in load_player_data(player_tag)["opponent_stats"].values()
+        if opp["total"] >= min_matches
     ]
 
     # Sort by total matches (most frequent first)
-    repeat_opponents.sort(key=lambda x: x.get("total", 0), reverse=True)
+    repeat_opponents.sort(key=itemgetter("total"), reverse=True)
 
     return repeat_opponents
 
@@ -338,10 +405,7 @@ def get_opponent_history(player_tag: str, opponent_tag: str) -> Optional[dict]:
 
 def get_player_stats(player_tag: str) -> dict:
     """Get current stats for a player"""
-    data = load_player_data(player_tag)
-    if not data.get("stats"):
-        data["stats"] = calculate_stats(data.get("battles", []))
-    return data["stats"]
+    return load_player_data(player_tag)["stats"]
 
 
 def format_stats_message(stats: dict) -> str:
@@ -353,7 +417,7 @@ def format_stats_message(stats: dict) -> str:
     msg = f"""📊 MONITORED BATTLE STATISTICS
 ========================================
 Total: {total['wins']}W / {total['losses']}L / {total['draws']}D ({total['total']} games)
-Win Rate: {total['win_rate']}%
+Win Rate: {calculate_win_rate(total)}%
 
 📋 BY GAME MODE:
 """
@@ -368,6 +432,6 @@ Win Rate: {total['win_rate']}%
     for mode, mode_stats in sorted_modes:
         msg += f"\n{mode}:\n"
         msg += f"  {mode_stats['wins']}W / {mode_stats['losses']}L / {mode_stats['draws']}D\n"
-        msg += f"  Win Rate: {mode_stats['win_rate']}% ({mode_stats['total']} games)\n"
+        msg += f"  Win Rate: {calculate_win_rate(mode_stats)}% ({mode_stats['total']} games)\n"
 
     return msg
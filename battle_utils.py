@@ -0,0 +1,75 @@
+import calendar
+from functools import lru_cache
+from typing import Optional
+
+
+def locate_player(team: list, opponent: list, pt_upper: str) -> tuple[Optional[dict], dict]:
+    """Find the player's entry and the enemy they faced.
+
+    pt_upper is the upper-cased player tag. API tags are already upper case,
+    so an exact match is tried before the case-insensitive one.
+    Returns (None, {}) when the player is on neither side.
+    """
+    for t in team:
+        tag = t.get("tag", "")
+        if tag == pt_upper or tag.upper() == pt_upper:
+            return t, (opponent[0] if opponent else {})
+
+    for o in opponent:
+        tag = o.get("tag", "")
+        if tag == pt_upper or tag.upper() == pt_upper:
+            return o, (team[0] if team else {})
+
+    return None, {}
+
+
+def _is_battle_time(battle_time: str) -> bool:
+    """Check that a value has the fixed-width API shape (20240101T120000.000Z)"""
+    if battle_time[8:9] != "T" or battle_time[15:16] != "." or not battle_time.endswith("Z"):
+        return False
+    digits = battle_time[:8] + battle_time[9:15]
+    return digits.isascii() and digits.isdigit()
+
+
+@lru_cache(maxsize=4096)
+def format_battle_time(battle_time: str) -> str:
+    """Format an API battle time (e.g. 20240101T120000.000Z) for display.
+
+    The format is fixed-width, so once its shape is checked the fields are
+    sliced out directly instead of going through strptime. Unparseable values
+    are returned unchanged. Cached like battle_timestamp, since the same
+    battles are formatted again when they are re-rendered.
+    """
+    if not _is_battle_time(battle_time):
+        return battle_time
+
+    return (
+        f"{battle_time[0:4]}-{battle_time[4:6]}-{battle_time[6:8]} "
+        f"{battle_time[9:11]}:{battle_time[11:13]}:{battle_time[13:15]} UTC"
+    )
+
+
+@lru_cache(maxsize=4096)
+def battle_timestamp(battle_time: str) -> int:
+    """Convert an API battle time to a Unix timestamp (0 if unparseable).
+
+    Cached because the same times reappear in every poll of the battle log.
+    """
+    if not _is_battle_time(battle_time):
+        return 0
+
+    return calendar.timegm((
+        int(battle_time[0:4]), int(battle_time[4:6]), int(battle_time[6:8]),
+        int(battle_time[9:11]), int(battle_time[11:13]), int(battle_time[13:15])
+    ))
+
+
+def calculate_win_rate(counts: dict) -> float:
+    """Calculate the win rate (in percent) of a wins/losses/draws/total bucket.
+
+    Win rates are derived on display rather than stored with the stats.
+    """
+    total = counts.get("total", 0)
+    if total > 0:
+        return round(counts.get("wins", 0) / total * 100, 1)
+    return 0.0
@@ -1,17 +1,22 @@
 import asyncio
+import heapq
 import logging
-import json
 import os
+import time
+import zlib
+from dataclasses import dataclass, fields
+from itertools import takewhile
 from pathlib import Path
 from typing import Optional
 from datetime import datetime
 
+import orjson
 from telegram import Update, Bot
-from telegram.ext import Application, CommandHandler, ContextTypes
+from telegram.ext import Application, CommandHandler, ContextTypes, filters
 
 from clash_api import ClashRoyaleAPI
 from formatters import (
-    format_player_info, format_battle, format_battle_short,
+    format_player_info, build_player_view, format_battle, format_battle_short,
     format_rivals_list, format_opponent_detail, format_repeat_opponent_alert
 )
 from battle_logger import (
@@ -19,6 +24,7 @@ from battle_logger import (
     load_player_data, save_player_data, get_repeat_opponents,
     get_opponent_history
 )
+from battle_utils import calculate_win_rate, battle_timestamp, locate_player
 
 # Configure logging
 logging.basicConfig(
@@ -29,13 +35,47 @@ logger = logging.getLogger(__name__)
 
 # Configuration
 ALLOWED_GROUP_ID = -1003474155849
+AUTHORIZED_FILTER = filters.Chat(chat_id=ALLOWED_GROUP_ID)
 MONITOR_FILE = "monitored_players.json"
+MONITOR_LOG = "monitored_players.log"  # Append-only field updates applied on top of MONITOR_FILE
+MONITOR_LOG_COMPACT_AT = 100  # Fold the log back into MONITOR_FILE after this many records
 CHECK_INTERVAL = 60  # Check for new battles every 60 seconds (1 minute)
-PLAYER_CHECK_DELAY = 2  # Delay between checking each player (seconds) to avoid rate limiting
+POLL_CONCURRENCY = 5  # Maximum number of players checked at the same time
+PIN_REFRESH_INTERVAL = 300  # Refresh idle players' pinned messages at most every 5 minutes
+MESSAGE_CHUNK_SIZE = 4000  # Stay under Telegram's 4096 character message limit
+
+ARENA_CHANGE_TEMPLATE = """🎉 ARENA CHANGE!
+
+{name} has reached a new arena!
+
+{previous_arena} ➡️ {current_arena}
+
+Current Trophies: {trophies:,} 🏆
+"""
+
+
+@dataclass(slots=True)
+class MonitoredPlayer:
+    """State kept for each monitored player"""
+    topic_id: int
+    last_battle_time: str = ""
+    name: str = ""
+    pinned_message_id: Optional[int] = None
+    last_arena: str = ""
+    last_pin_update: float = 0.0
+    last_pin_hash: Optional[int] = None
+
+
+_MONITORED_FIELDS = frozenset(f.name for f in fields(MonitoredPlayer))
 
 # Global state
-monitored_players: dict = {}  # {player_tag: {"topic_id": int, "last_battle_time": str, "name": str, "pinned_message_id": int}}
+monitored_players: dict[str, MonitoredPlayer] = {}
 clash_api: Optional[ClashRoyaleAPI] = None
+_pending_updates: list[bytes] = []  # Log records not yet appended to MONITOR_LOG
+_monitor_log = None  # Append handle for MONITOR_LOG, opened on first flush
+_monitor_log_records = 0
+_save_lock = asyncio.Lock()
+_monitors_changed = asyncio.Event()  # Set when a player is added or removed, wakes the poll scheduler
 
 
 def load_env_file(filepath: str) -> str:
@@ -45,35 +85,109 @@ def load_env_file(filepath: str) -> str:
 
 
 def load_monitored_players():
-    """Load monitored players from file"""
+    """Load monitored players from file and replay the update log"""
     global monitored_players
     if os.path.exists(MONITOR_FILE):
-        with open(MONITOR_FILE, "r") as f:
-            monitored_players = json.load(f)
+        raw = orjson.loads(Path(MONITOR_FILE).read_bytes())
+        monitored_players = {
+            tag: MonitoredPlayer(**{k: v for k, v in entry.items() if k in _MONITORED_FIELDS})
+            for tag, entry in raw.items()
+        }
+
+    if os.path.exists(MONITOR_LOG):
+        replayed = 0
+        for line in Path(MONITOR_LOG).read_bytes().splitlines():
+            try:
+                record = orjson.loads(line)
+            except orjson.JSONDecodeError:
+                # A crash mid-append can leave a truncated last line
+                logger.warning("Skipping malformed monitored players log record")
+                continue
+            entry = monitored_players.get(record.pop("tag", None))
+            if entry is None:
+                continue
+            for key, value in record.items():
+                if key in _MONITORED_FIELDS:
+                    setattr(entry, key, value)
+            replayed += 1
+        logger.info(f"Replayed {replayed} monitored player updates")
+        # Start from a compacted file with an empty log
+        save_monitored_players()
+
     logger.info(f"Loaded {len(monitored_players)} monitored players")
 
 
 def save_monitored_players():
-    """Save monitored players to file"""
-    with open(MONITOR_FILE, "w") as f:
-        json.dump(monitored_players, f, indent=2)
+    """Save monitored players to file and clear the update log"""
+    global _monitor_log_records
+    Path(MONITOR_FILE).write_bytes(orjson.dumps(monitored_players, option=orjson.OPT_INDENT_2))
+    if _monitor_log is not None:
+        _monitor_log.truncate(0)
+    else:
+        Path(MONITOR_LOG).unlink(missing_ok=True)
+    _monitor_log_records = 0
 
 
-def check_group_access(update: Update) -> bool:
-    """Check if command is from allowed group"""
-    chat_id = update.effective_chat.id
-    if chat_id != ALLOWED_GROUP_ID:
-        logger.warning(f"Unauthorized access attempt from chat {chat_id}")
-        return False
-    return True
+def record_monitored_update(player_tag: str, **changes):
+    """Queue a field update for a monitored player; written by the next flush"""
+    _pending_updates.append(orjson.dumps({"tag": player_tag, **changes}) + b"\n")
 
 
-async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Handle /start command"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
+def _append_monitor_log(payload: bytes):
+    """Append records to the update log, opening it on first use"""
+    global _monitor_log
+    if _monitor_log is None:
+        _monitor_log = open(MONITOR_LOG, "ab")
+    _monitor_log.write(payload)
+    _monitor_log.flush()
+
+
+async def flush_monitored_players():
+    """Append queued updates to the log, compacting it once it grows large"""
+    global _monitor_log_records
+    if not _pending_updates:
         return
+    async with _save_lock:
+        records = len(_pending_updates)
+        payload = b"".join(_pending_updates)
+        _pending_updates.clear()
+        await asyncio.to_thread(_append_monitor_log, payload)
+        _monitor_log_records += records
+
+        if _monitor_log_records >= MONITOR_LOG_COMPACT_AT:
+            # Serialize on the event loop so handlers can't mutate the dict mid-dump
+            save_monitored_players()
+
+
+def close_monitored_players():
+    """Compact pending state into the main file and close the update log"""
+    global _monitor_log
+    _pending_updates.clear()
+    save_monitored_players()
+    if _monitor_log is not None:
+        _monitor_log.close()
+        _monitor_log = None
+
+
+def normalize_tag(tag: str) -> str:
+    """Upper-case a player/clan tag and make sure it starts with #"""
+    return "#" + tag.upper().removeprefix("#")
+
+
+async def unauthorized_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Reject commands sent from any chat other than the allowed group"""
+    logger.warning(f"Unauthorized access attempt from chat {update.effective_chat.id}")
+    await update.effective_message.reply_text("This bot only works in the authorized group.")
+
 
+async def reply_chunked(reply, msg: str, size: int = MESSAGE_CHUNK_SIZE):
+    """Send a long message as consecutive chunks of at most size characters"""
+    for i in range(0, len(msg), size):
+        await reply(msg[i:i + size])
+
+
+async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Handle /start command"""
     await update.message.reply_text(
         "Clash Royale Monitor Bot\n\n"
         "Available commands:\n"
@@ -91,17 +205,11 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /search command"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not context.args:
         await update.message.reply_text("Usage: /search <playertag>")
         return
 
-    player_tag = context.args[0].upper()
-    if not player_tag.startswith("#"):
-        player_tag = "#" + player_tag
+    player_tag = normalize_tag(context.args[0])
 
     await update.message.reply_text(f"🔍 Searching for player {player_tag}...")
 
@@ -122,15 +230,11 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         monitored_stats = get_player_stats(player_tag)
 
         # Format and send response
-        msg = format_player_info(player, clan, chests, monitored_stats)
+        view = build_player_view(player, clan)
+        msg = format_player_info(view, chests, monitored_stats)
 
         # Split message if too long (Telegram limit is 4096 chars)
-        if len(msg) > 4000:
-            parts = [msg[i:i+4000] for i in range(0, len(msg), 4000)]
-            for part in parts:
-                await update.message.reply_text(part)
-        else:
-            await update.message.reply_text(msg)
+        await reply_chunked(update.message.reply_text, msg)
 
     except ValueError as e:
         await update.message.reply_text(f"❌ Player not found: {player_tag}")
@@ -143,17 +247,11 @@ async def search_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /stats command - show monitored battle statistics"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not context.args:
         await update.message.reply_text("Usage: /stats <playertag>")
         return
 
-    player_tag = context.args[0].upper()
-    if not player_tag.startswith("#"):
-        player_tag = "#" + player_tag
+    player_tag = normalize_tag(context.args[0])
 
     stats = get_player_stats(player_tag)
 
@@ -162,13 +260,15 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     total = stats["total"]
-    msg = f"📊 Battle Statistics for {player_tag}\n"
-    msg += "=" * 40 + "\n\n"
-    msg += f"Total: {total['wins']}W / {total['losses']}L / {total['draws']}D\n"
-    msg += f"Games Played: {total['total']}\n"
-    msg += f"Win Rate: {total['win_rate']}%\n\n"
-    msg += "BY GAME MODE:\n"
-    msg += "-" * 20 + "\n"
+    parts = [
+        f"📊 Battle Statistics for {player_tag}\n",
+        "=" * 40 + "\n\n",
+        f"Total: {total['wins']}W / {total['losses']}L / {total['draws']}D\n",
+        f"Games Played: {total['total']}\n",
+        f"Win Rate: {calculate_win_rate(total)}%\n\n",
+        "BY GAME MODE:\n",
+        "-" * 20 + "\n",
+    ]
 
     sorted_modes = sorted(
         stats["by_mode"].items(),
@@ -177,19 +277,17 @@ async def stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     )
 
     for mode, mode_stats in sorted_modes:
-        msg += f"\n{mode}:\n"
-        msg += f"  Record: {mode_stats['wins']}W / {mode_stats['losses']}L / {mode_stats['draws']}D\n"
-        msg += f"  Games: {mode_stats['total']} | Win Rate: {mode_stats['win_rate']}%\n"
+        parts.append(
+            f"\n{mode}:\n"
+            f"  Record: {mode_stats['wins']}W / {mode_stats['losses']}L / {mode_stats['draws']}D\n"
+            f"  Games: {mode_stats['total']} | Win Rate: {calculate_win_rate(mode_stats)}%\n"
+        )
 
-    await update.message.reply_text(msg)
+    await update.message.reply_text("".join(parts))
 
 
 async def rivals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /rivals command - show repeat opponents and head-to-head stats"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not context.args:
         await update.message.reply_text(
             "Usage:\n"
@@ -198,15 +296,11 @@ async def rivals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         )
         return
 
-    player_tag = context.args[0].upper()
-    if not player_tag.startswith("#"):
-        player_tag = "#" + player_tag
+    player_tag = normalize_tag(context.args[0])
 
     # Check if asking for specific opponent
     if len(context.args) >= 2:
-        opponent_tag = context.args[1].upper()
-        if not opponent_tag.startswith("#"):
-            opponent_tag = "#" + opponent_tag
+        opponent_tag = normalize_tag(context.args[1])
 
         # Get detailed history against specific opponent
         opponent = get_opponent_history(player_tag, opponent_tag)
@@ -221,8 +315,8 @@ async def rivals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
 
     # Get player name for display
-    player_data = monitored_players.get(player_tag, {})
-    player_name = player_data.get("name", player_tag)
+    player_data = monitored_players.get(player_tag)
+    player_name = player_data.name if player_data else player_tag
 
     # Get repeat opponents
     rivals = get_repeat_opponents(player_tag, min_matches=2)
@@ -236,32 +330,21 @@ async def rivals_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     msg = format_rivals_list(rivals, player_name)
 
-    # Split message if too long
-    if len(msg) > 4000:
-        parts = [msg[i:i+4000] for i in range(0, len(msg), 4000)]
-        for part in parts:
-            await update.message.reply_text(part)
-    else:
-        await update.message.reply_text(msg)
+    # Split message if too long (Telegram limit is 4096 chars)
+    await reply_chunked(update.message.reply_text, msg)
 
 
 async def monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /monitor command - creates a forum topic and monitors player"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not context.args:
         await update.message.reply_text("Usage: /monitor <playertag>")
         return
 
-    player_tag = context.args[0].upper()
-    if not player_tag.startswith("#"):
-        player_tag = "#" + player_tag
+    player_tag = normalize_tag(context.args[0])
 
     # Check if already monitoring
     if player_tag in monitored_players:
-        topic_id = monitored_players[player_tag].get("topic_id")
+        topic_id = monitored_players[player_tag].topic_id
         await update.message.reply_text(
             f"⚠️ Already monitoring {player_tag}\n"
             f"Topic ID: {topic_id}"
@@ -306,13 +389,13 @@ async def monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             # Get existing stats if any
             monitored_stats = get_player_stats(player_tag)
 
-            msg = f"🔔 MONITORING STARTED\n\n{format_player_info(player, clan, chests, monitored_stats)}"
+            msg = f"🔔 MONITORING STARTED\n\n{format_player_info(build_player_view(player, clan), chests, monitored_stats)}"
 
             # Send and pin the message in the topic
             sent_msg = await bot.send_message(
                 chat_id=ALLOWED_GROUP_ID,
                 message_thread_id=topic_id,
-                text=msg[:4000]
+                text=msg[:MESSAGE_CHUNK_SIZE]
             )
 
             pinned_message_id = sent_msg.message_id
@@ -346,14 +429,15 @@ async def monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
             current_arena = player.get("arena", {}).get("name", "")
 
             # Save to monitored players
-            monitored_players[player_tag] = {
-                "topic_id": topic_id,
-                "last_battle_time": last_battle_time,
-                "name": player_name,
-                "pinned_message_id": pinned_message_id,
-                "last_arena": current_arena
-            }
+            monitored_players[player_tag] = MonitoredPlayer(
+                topic_id=topic_id,
+                last_battle_time=last_battle_time,
+                name=player_name,
+                pinned_message_id=pinned_message_id,
+                last_arena=current_arena
+            )
             save_monitored_players()
+            _monitors_changed.set()
 
             await update.message.reply_text(
                 f"✅ Now monitoring {player_name} ({player_tag})\n"
@@ -375,17 +459,11 @@ async def monitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def unmonitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Handle /unmonitor command"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not context.args:
         await update.message.reply_text("Usage: /unmonitor <playertag>")
         return
 
-    player_tag = context.args[0].upper()
-    if not player_tag.startswith("#"):
-        player_tag = "#" + player_tag
+    player_tag = normalize_tag(context.args[0])
 
     if player_tag not in monitored_players:
         await update.message.reply_text(f"⚠️ Player {player_tag} is not being monitored.")
@@ -393,10 +471,11 @@ async def unmonitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     player_data = monitored_players.pop(player_tag)
     save_monitored_players()
+    _monitors_changed.set()
 
     # Try to close the topic
     bot: Bot = context.bot
-    topic_id = player_data.get("topic_id")
+    topic_id = player_data.topic_id
 
     if topic_id:
         try:
@@ -405,70 +484,80 @@ async def unmonitor_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 message_thread_id=topic_id
             )
             await update.message.reply_text(
-                f"✅ Stopped monitoring {player_data['name']} ({player_tag})\n"
+                f"✅ Stopped monitoring {player_data.name} ({player_tag})\n"
                 f"📌 Topic has been closed.\n"
                 f"📊 Battle logs are preserved in the monitoring folder."
             )
         except Exception as e:
             logger.warning(f"Could not close topic: {e}")
             await update.message.reply_text(
-                f"✅ Stopped monitoring {player_data['name']} ({player_tag})\n"
+                f"✅ Stopped monitoring {player_data.name} ({player_tag})\n"
                 f"⚠️ Could not close topic automatically."
             )
     else:
         await update.message.reply_text(
-            f"✅ Stopped monitoring {player_data['name']} ({player_tag})"
+            f"✅ Stopped monitoring {player_data.name} ({player_tag})"
         )
 
 
 async def list_monitors_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """List all monitored players"""
-    if not check_group_access(update):
-        await update.message.reply_text("This bot only works in the authorized group.")
-        return
-
     if not monitored_players:
         await update.message.reply_text("📋 No players are currently being monitored.")
         return
 
-    msg = "📋 Monitored Players:\n\n"
+    parts = ["📋 Monitored Players:\n\n"]
     for tag, data in monitored_players.items():
-        topic_id = data.get("topic_id", "N/A")
         stats = get_player_stats(tag)
         total_games = stats.get("total", {}).get("total", 0) if stats else 0
-        win_rate = stats.get("total", {}).get("win_rate", 0) if stats else 0
-        msg += f"• {data['name']} ({tag})\n"
-        msg += f"  Topic #{topic_id} | {total_games} games | {win_rate}% WR\n"
+        win_rate = calculate_win_rate(stats.get("total", {})) if stats else 0
+        parts.append(
+            f"• {data.name} ({tag})\n"
+            f"  Topic #{data.topic_id} | {total_games} games | {win_rate}% WR\n"
+        )
+
+    await update.message.reply_text("".join(parts))
+
 
-    await update.message.reply_text(msg)
+async def fetch_player_snapshot(player_tag: str, with_chests: bool = True) -> tuple[Optional[dict], Optional[dict]]:
+    """Fetch a player's profile and, optionally, upcoming chests concurrently.
 
+    Returns (player, chests); player is None if it could not be fetched and
+    chests is None when not requested.
+    """
+    calls = [asyncio.wait_for(clash_api.get_player(player_tag), timeout=15)]
+    if with_chests:
+        calls.append(asyncio.wait_for(clash_api.get_player_chests(player_tag), timeout=15))
+    results = await asyncio.gather(*calls, return_exceptions=True)
+
+    player = results[0]
+    if isinstance(player, BaseException):
+        logger.warning(f"Could not fetch player data for {player_tag}: {player!r}")
+        player = None
+
+    chests = None
+    if with_chests:
+        chests = results[1]
+        if isinstance(chests, BaseException):
+            chests = {"items": []}
 
-async def update_pinned_message(bot: Bot, player_tag: str, data: dict):
-    """Update the pinned message with fresh player data (text only)"""
+    return player, chests
+
+
+async def update_pinned_message(bot: Bot, player_tag: str, data: MonitoredPlayer, player: Optional[dict], chests: dict):
+    """Update the pinned message with already fetched player data (text only)"""
     try:
-        topic_id = data.get("topic_id")
-        pinned_message_id = data.get("pinned_message_id")
+        topic_id = data.topic_id
+        pinned_message_id = data.pinned_message_id
 
         if not topic_id or not pinned_message_id:
             return
 
-        # Fetch fresh player data with timeout
-        try:
-            player = await asyncio.wait_for(
-                clash_api.get_player(player_tag),
-                timeout=15
-            )
-        except asyncio.TimeoutError:
-            logger.warning(f"Timeout fetching player data for {player_tag}, skipping update")
+        if player is None:
+            logger.warning(f"No player data for {player_tag}, skipping pinned message update")
             return
 
-        try:
-            chests = await asyncio.wait_for(
-                clash_api.get_player_chests(player_tag),
-                timeout=15
-            )
-        except asyncio.TimeoutError:
-            chests = {"items": []}
+        data.last_pin_update = time.time()
 
         clan = None
         if player.get("clan"):
@@ -483,7 +572,19 @@ async def update_pinned_message(bot: Bot, player_tag: str, data: dict):
         # Get monitored stats
         monitored_stats = get_player_stats(player_tag)
 
-        msg = f"🔔 MONITORING ACTIVE\n\n{format_player_info(player, clan, chests, monitored_stats)}"
+        view = build_player_view(player, clan)
+
+        # Skip the edit when nothing shown on the pin has changed; Telegram
+        # rejects identical edits anyway. Hash only the rendered fields: the raw
+        # clan response carries member data that changes constantly.
+        pin_hash = zlib.crc32(orjson.dumps([
+            view._asdict(), chests.get("items", [])[:12], monitored_stats
+        ]))
+        if data.last_pin_hash == pin_hash:
+            logger.debug(f"Pinned message for {player_tag} is unchanged")
+            return
+
+        msg = f"🔔 MONITORING ACTIVE\n\n{format_player_info(view, chests, monitored_stats)}"
 
         # Edit the pinned message with timeout
         try:
@@ -491,10 +592,11 @@ async def update_pinned_message(bot: Bot, player_tag: str, data: dict):
                 bot.edit_message_text(
                     chat_id=ALLOWED_GROUP_ID,
                     message_id=pinned_message_id,
-                    text=msg[:4000]
+                    text=msg[:MESSAGE_CHUNK_SIZE]
                 ),
                 timeout=15
             )
+            data.last_pin_hash = pin_hash
             logger.debug(f"Updated pinned message for {player_tag}")
         except asyncio.TimeoutError:
             logger.warning(f"Timeout editing pinned message for {player_tag}")
@@ -503,149 +605,225 @@ async def update_pinned_message(bot: Bot, player_tag: str, data: dict):
         logger.error(f"Error updating pinned message for {player_tag}: {e}")
 
 
-async def check_battles(app: Application):
-    """Background task to check for new battles and update stats"""
-    bot = app.bot
+async def record_new_battles(bot: Bot, player_tag: str, data: MonitoredPlayer, pin_due: bool):
+    """Fetch a player's battles, announce and log the new ones.
 
-    while True:
+    Returns (had_new_battles, player, chests), or None if there is nothing
+    left to do for this player.
+    """
+    # Fetch battles, profile and (when needed) chests in parallel; the profile
+    # is shared by the arena check and the pinned message
+    battles, (player_info, chests) = await asyncio.gather(
+        asyncio.wait_for(clash_api.get_player_battles(player_tag), timeout=20),
+        fetch_player_snapshot(player_tag, with_chests=pin_due),
+        return_exceptions=True
+    )
+
+    if isinstance(battles, asyncio.TimeoutError):
+        logger.warning(f"Timeout fetching battles for {player_tag}")
+        return None
+    if isinstance(battles, BaseException):
+        raise battles
+
+    if not battles:
+        # Still update the pinned message even if no new battles
+        if pin_due:
+            await update_pinned_message(bot, player_tag, data, player_info, chests)
+        return None
+
+    last_known_time = data.last_battle_time
+    last_known_ts = battle_timestamp(last_known_time)
+    topic_id = data.topic_id
+
+    if not topic_id:
+        logger.warning(f"No topic_id for player {player_tag}, skipping")
+        return None
+
+    # Find new battles
+    # Battles are sorted by time desc, so stop at the first one already seen
+    new_battles = list(takewhile(
+        lambda battle: battle_timestamp(battle.get("battleTime", "")) > last_known_ts,
+        battles
+    ))
+
+    # Process new battles (oldest first)
+    had_new_battles = len(new_battles) > 0
+
+    pt_upper = player_tag.upper()
+    for battle in reversed(new_battles):
+        # Check for repeat opponent BEFORE adding the battle
+        _, enemy = locate_player(battle.get("team", []), battle.get("opponent", []), pt_upper)
+        enemy_tag = enemy.get("tag", "").upper()
+
+        # Get previous history with this opponent (before recording current battle)
+        previous_opponent_stats = get_opponent_history(player_tag, enemy_tag) if enemy_tag else None
+
+        # Log battle to file and get updated stats
+        stats, updated_opponent = add_battle(player_tag, battle)
+
+        # Format battle message
+        msg = format_battle_short(battle, player_tag)
+
+        # Add repeat opponent alert if this is a rematch
+        if previous_opponent_stats and previous_opponent_stats.get("total", 0) >= 1:
+            if updated_opponent:
+                rival_msg = format_repeat_opponent_alert(updated_opponent, is_new_battle=False)
+                msg += f"\n\n🎯 {rival_msg}"
+
+        # Add current session stats to battle notification
+        if stats and stats.get("total", {}).get("total", 0) > 0:
+            total = stats["total"]
+            msg += f"\n\n📊 Session: {total['wins']}W/{total['losses']}L ({calculate_win_rate(total)}% WR)"
+
+        # Send to topic
+        await bot.send_message(
+            chat_id=ALLOWED_GROUP_ID,
+            message_thread_id=topic_id,
+            text=f"NEW BATTLE\n{msg}"
+        )
+
+    # Update last battle time
+    latest_time = battles[0].get("battleTime", "")
+    if latest_time != last_known_time:
+        data.last_battle_time = latest_time
+        record_monitored_update(player_tag, last_battle_time=latest_time)
+        # Persist now: these battles are already announced, so losing this
+        # record in a crash during the wait below would announce them again
+        await flush_monitored_players()
+
+    return had_new_battles, player_info, chests
+
+
+async def check_arena_change(bot: Bot, player_tag: str, data: MonitoredPlayer, player_info: Optional[dict]):
+    """Announce and store a change of the player's arena"""
+    if player_info is not None:
         try:
-            for player_tag, data in list(monitored_players.items()):
-                try:
-                    # Fetch battles with timeout
-                    try:
-                        battles = await asyncio.wait_for(
-                            clash_api.get_player_battles(player_tag),
-                            timeout=20
-                        )
-                    except asyncio.TimeoutError:
-                        logger.warning(f"Timeout fetching battles for {player_tag}")
-                        await asyncio.sleep(PLAYER_CHECK_DELAY)
-                        continue
-
-                    if not battles:
-                        # Still update the pinned message even if no new battles
-                        await update_pinned_message(bot, player_tag, data)
-                        await asyncio.sleep(PLAYER_CHECK_DELAY)
-                        continue
-
-                    last_known_time = data.get("last_battle_time", "")
-                    topic_id = data.get("topic_id")
-
-                    if not topic_id:
-                        logger.warning(f"No topic_id for player {player_tag}, skipping")
-                        continue
-
-                    # Find new battles
-                    new_battles = []
-                    for battle in battles:
-                        battle_time = battle.get("battleTime", "")
-                        if battle_time and battle_time > last_known_time:
-                            new_battles.append(battle)
-                        else:
-                            break  # Battles are sorted by time desc
-
-                    # Process new battles (oldest first)
-                    had_new_battles = len(new_battles) > 0
-
-                    for battle in reversed(new_battles):
-                        # Check for repeat opponent BEFORE adding the battle
-                        enemy_tag = ""
-                        team = battle.get("team", [])
-                        opponent = battle.get("opponent", [])
-                        for t in team:
-                            if t.get("tag", "").upper() == player_tag.upper():
-                                enemy_tag = opponent[0].get("tag", "").upper() if opponent else ""
-                                break
-                        if not enemy_tag:
-                            for o in opponent:
-                                if o.get("tag", "").upper() == player_tag.upper():
-                                    enemy_tag = team[0].get("tag", "").upper() if team else ""
-                                    break
-
-                        # Get previous history with this opponent (before recording current battle)
-                        previous_opponent_stats = get_opponent_history(player_tag, enemy_tag) if enemy_tag else None
-
-                        # Log battle to file and get updated stats
-                        stats = add_battle(player_tag, battle)
-
-                        # Format battle message
-                        msg = format_battle_short(battle, player_tag)
-
-                        # Add repeat opponent alert if this is a rematch
-                        if previous_opponent_stats and previous_opponent_stats.get("total", 0) >= 1:
-                            # Get updated opponent stats after recording this battle
-                            updated_opponent = get_opponent_history(player_tag, enemy_tag)
-                            if updated_opponent:
-                                rival_msg = format_repeat_opponent_alert(updated_opponent, is_new_battle=False)
-                                msg += f"\n\n🎯 {rival_msg}"
-
-                        # Add current session stats to battle notification
-                        if stats and stats.get("total", {}).get("total", 0) > 0:
-                            total = stats["total"]
-                            msg += f"\n\n📊 Session: {total['wins']}W/{total['losses']}L ({total['win_rate']}% WR)"
-
-                        # Send to topic
-                        await bot.send_message(
-                            chat_id=ALLOWED_GROUP_ID,
-                            message_thread_id=topic_id,
-                            text=f"NEW BATTLE\n{msg}"
+            current_arena = player_info.get("arena", {}).get("name", "")
+            previous_arena = data.last_arena
+
+            if current_arena != previous_arena:
+                if previous_arena:
+                    # Arena changed! Send notification
+                    await bot.send_message(
+                        chat_id=ALLOWED_GROUP_ID,
+                        message_thread_id=data.topic_id,
+                        text=ARENA_CHANGE_TEMPLATE.format(
+                            name=data.name,
+                            previous_arena=previous_arena,
+                            current_arena=current_arena,
+                            trophies=player_info.get("trophies", 0)
                         )
+                    )
 
-                    # Update last battle time
-                    if battles:
-                        monitored_players[player_tag]["last_battle_time"] = battles[0].get("battleTime", "")
-                        save_monitored_players()
-
-                    # If we had new battles, wait 30 seconds before updating pinned message
-                    if had_new_battles:
-                        logger.info(f"Waiting 30s before updating pinned message for {player_tag}")
-                        await asyncio.sleep(30)
-
-                    # Check for arena change
-                    try:
-                        player_info = await asyncio.wait_for(
-                            clash_api.get_player(player_tag),
-                            timeout=15
-                        )
-                        current_arena = player_info.get("arena", {}).get("name", "")
-                        current_trophies = player_info.get("trophies", 0)
-                        previous_arena = data.get("last_arena", "")
+                # Update stored arena
+                data.last_arena = current_arena
+                record_monitored_update(player_tag, last_arena=current_arena)
 
-                        if previous_arena and current_arena != previous_arena:
-                            # Arena changed! Send notification
-                            arena_msg = f"""🎉 ARENA CHANGE!
+        except Exception as e:
+            logger.warning(f"Error checking arena for {player_tag}: {e}")
 
-{data['name']} has reached a new arena!
 
-{previous_arena} ➡️ {current_arena}
+async def check_player(bot: Bot, player_tag: str, data: MonitoredPlayer, semaphore: asyncio.Semaphore):
+    """Check one monitored player for new battles and refresh their topic.
 
-Current Trophies: {current_trophies:,} 🏆
-"""
-                            await bot.send_message(
-                                chat_id=ALLOWED_GROUP_ID,
-                                message_thread_id=topic_id,
-                                text=arena_msg
-                            )
+    The semaphore is only held while talking to the APIs, not during the
+    settle delay after new battles, so one busy player can't stall the others.
+    """
+    # Idle players only get their pinned message refreshed every few minutes
+    pin_due = time.time() - data.last_pin_update >= PIN_REFRESH_INTERVAL
 
-                        # Update stored arena
-                        monitored_players[player_tag]["last_arena"] = current_arena
-                        save_monitored_players()
+    async with semaphore:
+        checked = await record_new_battles(bot, player_tag, data, pin_due)
+    if checked is None:
+        return
+    had_new_battles, player_info, chests = checked
 
-                    except asyncio.TimeoutError:
-                        logger.warning(f"Timeout checking arena for {player_tag}")
-                    except Exception as e:
-                        logger.warning(f"Error checking arena for {player_tag}: {e}")
+    # If we had new battles, wait 30 seconds before updating pinned message
+    if had_new_battles:
+        logger.info(f"Waiting 30s before updating pinned message for {player_tag}")
+        await asyncio.sleep(30)
 
-                    # Update pinned message with fresh data
-                    await update_pinned_message(bot, player_tag, data)
+    async with semaphore:
+        if had_new_battles:
+            # Re-fetch so the arena check and pinned message reflect the new battles
+            player_info, chests = await fetch_player_snapshot(player_tag)
 
-                except Exception as e:
-                    logger.error(f"Error checking battles for {player_tag}: {e}")
+        await check_arena_change(bot, player_tag, data, player_info)
 
-                # Small delay between players to avoid rate limiting
-                await asyncio.sleep(PLAYER_CHECK_DELAY)
+        # Update pinned message with fresh data
+        if had_new_battles or pin_due:
+            await update_pinned_message(bot, player_tag, data, player_info, chests)
 
-            await asyncio.sleep(CHECK_INTERVAL)
+
+async def _poll_player(bot: Bot, player_tag: str, data: MonitoredPlayer, semaphore: asyncio.Semaphore):
+    """Run check_player for one player, logging any error"""
+    try:
+        await check_player(bot, player_tag, data, semaphore)
+    except Exception as e:
+        logger.error(f"Error checking battles for {player_tag}: {e}")
+
+    # Persist whatever this check changed
+    await flush_monitored_players()
+
+
+async def _wait_for_monitors_change(timeout: Optional[float]) -> bool:
+    """Sleep up to timeout seconds, returning True early if players were added or removed"""
+    try:
+        await asyncio.wait_for(_monitors_changed.wait(), timeout)
+        return True
+    except asyncio.TimeoutError:
+        return False
+
+
+async def check_battles(app: Application):
+    """Background task to check for new battles and update stats.
+
+    Each player is polled once per CHECK_INTERVAL, with players spread evenly
+    across the interval instead of all being polled in one burst. Whenever the
+    set of players changes the slots are spread out again, new players first.
+    """
+    bot = app.bot
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(POLL_CONCURRENCY)
+    schedule: list[tuple[float, str]] = []  # Heap of (next poll time, player tag)
+    scheduled: set[str] = set()
+    in_flight: dict[str, asyncio.Task] = {}
+
+    while True:
+        try:
+            _monitors_changed.clear()
+            if monitored_players.keys() != scheduled:
+                # Re-spread every slot over one interval; a sorted list is a valid heap
+                now = loop.time()
+                new_tags = [tag for tag in monitored_players if tag not in scheduled]
+                kept_tags = [tag for _, tag in sorted(schedule) if tag in monitored_players]
+                order = new_tags + kept_tags
+                schedule = [(now + i * CHECK_INTERVAL / len(order), tag) for i, tag in enumerate(order)]
+                scheduled = set(order)
+
+            if not schedule:
+                await _wait_for_monitors_change(None)
+                continue
+
+            due, player_tag = schedule[0]
+            delay = due - loop.time()
+            if delay > 0 and await _wait_for_monitors_change(delay):
+                continue
+            heapq.heappop(schedule)
+
+            data = monitored_players.get(player_tag)
+            if data is None:
+                # Player was unmonitored while waiting for their slot
+                scheduled.discard(player_tag)
+                continue
+
+            # Skip a slot rather than overlap checks of the same player
+            if player_tag not in in_flight:
+                task = asyncio.create_task(_poll_player(bot, player_tag, data, semaphore))
+                in_flight[player_tag] = task
+                task.add_done_callback(lambda _, tag=player_tag: in_flight.pop(tag, None))
+
+            heapq.heappush(schedule, (due + CHECK_INTERVAL, player_tag))
 
         except Exception as e:
             logger.error(f"Error in battle check loop: {e}")
@@ -661,6 +839,12 @@ async def post_init(app: Application):
     logger.info("Bot initialized, battle checker started")
 
 
+async def post_shutdown(app: Application):
+    """Save pending state and release the shared Clash API session when the bot stops"""
+    close_monitored_players()
+    await clash_api.close()
+
+
 def main():
     global clash_api
 
@@ -676,16 +860,27 @@ def main():
     ensure_monitoring_dir()
 
     # Create application
-    app = Application.builder().token(telegram_token).post_init(post_init).build()
-
-    # Add handlers
-    app.add_handler(CommandHandler("start", start_command))
-    app.add_handler(CommandHandler("search", search_command))
-    app.add_handler(CommandHandler("monitor", monitor_command))
-    app.add_handler(CommandHandler("unmonitor", unmonitor_command))
-    app.add_handler(CommandHandler("listmonitors", list_monitors_command))
-    app.add_handler(CommandHandler("stats", stats_command))
-    app.add_handler(CommandHandler("rivals", rivals_command))
+    app = (
+        Application.builder()
+        .token(telegram_token)
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    # Add handlers; commands from other chats never reach them
+    app.add_handler(CommandHandler("start", start_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("search", search_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("monitor", monitor_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("unmonitor", unmonitor_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("listmonitors", list_monitors_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("stats", stats_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler("rivals", rivals_command, filters=AUTHORIZED_FILTER))
+    app.add_handler(CommandHandler(
+        ["start", "search", "monitor", "unmonitor", "listmonitors", "stats", "rivals"],
+        unauthorized_command,
+        filters=~AUTHORIZED_FILTER,
+    ))
 
     # Run bot
     logger.info("Starting Clash Royale Monitor Bot...")
@@ -1,20 +1,53 @@
 import aiohttp
 import asyncio
+import time
 import urllib.parse
+from functools import lru_cache
 from typing import Optional
 
+import orjson
+
 
 class ClashRoyaleAPI:
     BASE_URL = "https://api.clashroyale.com/v1"
 
+    # Adaptive token bucket: the request rate (per second) grows while calls
+    # succeed and is cut back multiplicatively on 429/5xx responses
+    INITIAL_RATE = 5.0
+    MIN_RATE = 0.5
+    MAX_RATE = 20.0
+    RATE_STEP = 0.1  # Minimum additive increase per successful request
+    RATE_GROWTH = 0.05  # Proportional increase per successful request
+    RATE_BACKOFF = 0.5  # Multiplier applied when the API pushes back
+    BUCKET_CAPACITY = 10  # Maximum burst size
+
     def __init__(self, api_key: str):
         self.api_key = api_key
         self.session: Optional[aiohttp.ClientSession] = None
         self.timeout = aiohttp.ClientTimeout(total=30)  # 30 second timeout
 
+        self._rate = self.INITIAL_RATE
+        self._tokens = float(self.BUCKET_CAPACITY)
+        self._last_refill = time.monotonic()
+
+    async def __aenter__(self) -> "ClashRoyaleAPI":
+        await self._get_session()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.close()
+
     async def _get_session(self) -> aiohttp.ClientSession:
+        # Created lazily because the connector must be built inside the running loop
         if self.session is None or self.session.closed:
+            connector = aiohttp.TCPConnector(
+                limit=50,
+                limit_per_host=20,
+                ttl_dns_cache=300,
+                keepalive_timeout=60
+            )
             self.session = aiohttp.ClientSession(
+                connector=connector,
                 headers={"Authorization": f"Bearer {self.api_key}"},
                 timeout=self.timeout
             )
@@ -24,33 +57,68 @@ class ClashRoyaleAPI:
         if self.session and not self.session.closed:
             await self.session.close()
 
-    def _encode_tag(self, tag: str) -> str:
+    @staticmethod
+    @lru_cache(maxsize=1024)
+    def _encode_tag(tag: str) -> str:
         """Encode player/clan tag for URL (# -> %23)"""
         if not tag.startswith("#"):
             tag = "#" + tag
         return urllib.parse.quote(tag)
 
+    async def _acquire_token(self):
+        """Wait until the token bucket allows another request"""
+        while True:
+            now = time.monotonic()
+            self._tokens = min(self.BUCKET_CAPACITY, self._tokens + (now - self._last_refill) * self._rate)
+            self._last_refill = now
+
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return
+
+            await asyncio.sleep((1 - self._tokens) / self._rate)
+
+    def _increase_rate(self):
+        """Speed up after a successful request"""
+        self._rate = min(self._rate + max(self.RATE_STEP, self.RATE_GROWTH * self._rate), self.MAX_RATE)
+
+    def _decrease_rate(self):
+        """Back off after the API signals overload, dropping any saved-up burst"""
+        self._rate = max(self.MIN_RATE, self.RATE_BACKOFF * self._rate)
+        self._tokens = 0.0
+
     async def _request(self, endpoint: str, retries: int = 3) -> dict:
         session = await self._get_session()
         url = f"{self.BASE_URL}{endpoint}"
 
         last_error = None
         for attempt in range(retries):
+            await self._acquire_token()
             try:
                 async with session.get(url) as response:
                     if response.status == 200:
-                        return await response.json()
+                        self._increase_rate()
+                        try:
+                            return orjson.loads(await response.read())
+                        except orjson.JSONDecodeError as e:
+                            # A proxy page served with 200 is transient; retry it like a network error
+                            raise aiohttp.ClientPayloadError(f"Invalid JSON response: {e}") from e
                     elif response.status == 404:
                         raise ValueError("Player or resource not found")
                     elif response.status == 403:
                         raise PermissionError("API key invalid or IP not whitelisted")
                     elif response.status == 429:
-                        # Rate limited, wait and retry
-                        wait_time = 2 ** attempt
-                        await asyncio.sleep(wait_time)
+                        # Rate limited: slow down, the bucket paces the retry
+                        self._decrease_rate()
                         continue
                     else:
-                        error_data = await response.json()
+                        if response.status >= 500:
+                            self._decrease_rate()
+                        try:
+                            error_data = orjson.loads(await response.read())
+                        except orjson.JSONDecodeError:
+                            # e.g. a gateway's HTML error page
+                            error_data = {}
                         raise Exception(f"API Error {response.status}: {error_data.get('message', 'Unknown error')}")
             except (aiohttp.ClientError, asyncio.TimeoutError) as e:
                 last_error = e
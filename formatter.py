@@ -1,105 +1,162 @@
-from datetime import datetime
-from typing import Optional, List
+import heapq
+import time
+from collections import ChainMap
+from functools import lru_cache
+from itertools import islice
+from operator import itemgetter
+from typing import Optional, List, NamedTuple
+
+from battle_utils import calculate_win_rate, format_battle_time, locate_player
+
+_SEP = "=" * 40
+_SUBSEP = "-" * 20
+
+# Fixed section headers
+_CHESTS_HEADER = f"\n{_SEP}\nUpcoming Chests:\n"
+_RIVALS_HEADER = f"{_SEP}\nRIVALS - Repeat Opponents for {{name}}\n{_SEP}\n\n"
+_MODES_HEADER = f"BY GAME MODE:\n{_SUBSEP}\n"
+_HISTORY_HEADER = f"\n{_SEP}\nRECENT MATCH HISTORY:\n{_SUBSEP}\n"
+
+# Battle result labels, indexed by the sign of the crown difference + 1
+_RESULT_LABELS = ("💀 DEFEAT", "🤝 DRAW", "🏆 VICTORY")
+
+# One entry of the rivals list; status is indexed by the sign of wins - losses + 1
+_RIVAL_TEMPLATE = """{i}. {name} ({tag})
+   Matches: {total} | Record: {wins}W/{losses}L/{draws}D
+   Win Rate: {win_rate}% | Status: {status}
+{modes_line}
+"""
+_RIVAL_STATUSES = ("Struggling", "Even", "Dominating")
+_RIVAL_DEFAULTS = {"name": "Unknown", "tag": "", "total": 0, "wins": 0, "losses": 0, "draws": 0}
+_RIVAL_FIELDS = itemgetter(*_RIVAL_DEFAULTS)
+
+# Display names for the clan roles returned by the API
+_ROLE_NAMES = {
+    "member": "Member",
+    "elder": "Elder",
+    "coLeader": "Co-Leader",
+    "leader": "Leader",
+}
+
+# Profile section of format_player_info, filled with str.format_map from a
+# PlayerView whose counters are already comma-grouped
+_PLAYER_TEMPLATE = f"{_SEP}\nPlayer: {{name}} ({{tag}})\nLast Updated: {{update_time}}\n{_SEP}\n" + """
+Trophies: {trophies} (Best: {best_trophies})
+Level: {exp_level}
+Arena: {arena_name}
 
+Battle Stats (All Time):
+- Wins: {wins}
+- Losses: {losses}
+- Total Battles: {battles}
+- Win Rate: {win_rate:.1f}%
+- 3-Crown Wins: {three_crown_wins}
 
-def format_player_info(player: dict, clan: Optional[dict], chests: dict, monitored_stats: Optional[dict] = None) -> str:
-    """Format player information for display"""
+Challenge Stats:
+- Max Wins: {challenge_max_wins}
+- Cards Won: {challenge_cards_won}
 
-    # Basic info
-    name = player.get("name", "Unknown")
-    tag = player.get("tag", "")
-    trophies = player.get("trophies", 0)
-    best_trophies = player.get("bestTrophies", 0)
-    exp_level = player.get("expLevel", 0)
+Tournament Stats:
+- Battles: {tournament_battle_count}
+- Cards Won: {tournament_cards_won}
 
-    # Arena info
-    arena = player.get("arena", {})
-    arena_name = arena.get("name", "Unknown Arena")
+Cards Found: {cards_found}
 
-    # Stats
-    wins = player.get("wins", 0)
-    losses = player.get("losses", 0)
-    battles = player.get("battleCount", 0)
-    three_crown_wins = player.get("threeCrownWins", 0)
+Donations:
+- Given: {donations}
+- Received: {donations_received}
+- Total Given: {total_donations}
 
-    # Challenge stats
-    challenge_max_wins = player.get("challengeMaxWins", 0)
-    challenge_cards_won = player.get("challengeCardsWon", 0)
+War Stats:
+- War Day Wins: {war_day_wins}
+- Clan Cards Collected: {clan_cards_collected}
 
-    # Tournament stats
-    tournament_cards_won = player.get("tournamentCardsWon", 0)
-    tournament_battle_count = player.get("tournamentBattleCount", 0)
+Current Deck:
+{deck_str}
+"""
 
-    # Card stats
-    cards_found = len(player.get("cards", []))
 
-    # Donations
-    donations = player.get("donations", 0)
-    donations_received = player.get("donationsReceived", 0)
-    total_donations = player.get("totalDonations", 0)
+@lru_cache(maxsize=1)
+def _format_utc_second(second: int) -> str:
+    """Format a Unix time (whole seconds) as a UTC timestamp"""
+    return time.strftime("%Y-%m-%d %H:%M:%S UTC", time.gmtime(second))
 
-    # War stats
-    war_day_wins = player.get("warDayWins", 0)
-    clan_cards_collected = player.get("clanCardsCollected", 0)
 
-    # Current deck
-    current_deck = player.get("currentDeck", [])
-    deck_str = ", ".join([card.get("name", "?") for card in current_deck[:8]])
+def _now_utc_str() -> str:
+    """Get the current UTC time, formatted at most once per second"""
+    return _format_utc_second(int(time.time()))
 
-    # Calculate win rate
-    win_rate = (wins / battles * 100) if battles > 0 else 0
 
-    # Get current time for "last updated"
-    update_time = datetime.utcnow().strftime("%Y-%m-%d %H:%M:%S UTC")
+def _fmt_ints(**values: int) -> dict:
+    """Format integers with thousands separators, keyed by name"""
+    return {key: f"{value:,}" for key, value in values.items()}
 
-    msg = f"""========================================
-Player: {name} ({tag})
-Last Updated: {update_time}
-========================================
 
-Trophies: {trophies:,} (Best: {best_trophies:,})
-Level: {exp_level}
-Arena: {arena_name}
+def _total_of(mode_item: tuple) -> int:
+    """Sort key for (mode, stats) pairs: number of games in that mode"""
+    return mode_item[1]["total"]
 
-Battle Stats (All Time):
-- Wins: {wins:,}
-- Losses: {losses:,}
-- Total Battles: {battles:,}
-- Win Rate: {win_rate:.1f}%
-- 3-Crown Wins: {three_crown_wins:,}
 
-Challenge Stats:
-- Max Wins: {challenge_max_wins}
-- Cards Won: {challenge_cards_won:,}
+def _mode_entry(mode_item: tuple) -> str:
+    """Format a (mode, stats) pair as 'mode: games'"""
+    return f"{mode_item[0]}: {mode_item[1]['total']}"
 
-Tournament Stats:
-- Battles: {tournament_battle_count:,}
-- Cards Won: {tournament_cards_won:,}
 
-Cards Found: {cards_found}
+def _card_name(card: dict) -> str:
+    """Get a card's display name"""
+    return card["name"] if "name" in card else "?"
 
-Donations:
-- Given: {donations:,}
-- Received: {donations_received:,}
-- Total Given: {total_donations:,}
 
-War Stats:
-- War Day Wins: {war_day_wins:,}
-- Clan Cards Collected: {clan_cards_collected:,}
+def _deck_str(cards: list) -> str:
+    """Format the first 8 cards of a deck as a comma-separated list of names"""
+    return ", ".join(map(_card_name, cards[:8]))
 
-Current Deck:
-{deck_str}
-"""
 
-    # Add clan info
-    player_clan = player.get("clan")
+class PlayerView(NamedTuple):
+    """Display fields extracted from a player (and their clan) once per fetch"""
+    name: str
+    tag: str
+    trophies: str
+    best_trophies: str
+    exp_level: int
+    arena_name: str
+    wins: str
+    losses: str
+    battles: str
+    win_rate: float
+    three_crown_wins: str
+    challenge_max_wins: int
+    challenge_cards_won: str
+    tournament_battle_count: str
+    tournament_cards_won: str
+    cards_found: int
+    donations: str
+    donations_received: str
+    total_donations: str
+    war_day_wins: str
+    clan_cards_collected: str
+    deck_str: str
+    clan_section: str  # Empty when the player is not in a clan
+
+
+def build_player_view(player: dict, clan: Optional[dict]) -> PlayerView:
+    """Extract everything format_player_info shows from the API responses"""
+    get = player.get
+
+    wins = get("wins", 0)
+    battles = get("battleCount", 0)
+
+    # Clan info
+    clan_section = ""
+    player_clan = get("clan")
     if player_clan:
         clan_name = player_clan.get("name", "Unknown")
         clan_tag = player_clan.get("tag", "")
-        role = player.get("role", "member").replace("elder", "Elder").replace("coLeader", "Co-Leader").replace("leader", "Leader").replace("member", "Member")
+        role = get("role", "member")
+        role = _ROLE_NAMES.get(role, role)
 
-        msg += f"""
-========================================
+        clan_section = f"""
+{_SEP}
 Clan: {clan_name} ({clan_tag})
 Role: {role}
 """
@@ -111,46 +168,78 @@ Role: {role}
             required_trophies = clan.get("requiredTrophies", 0)
             donations_per_week = clan.get("donationsPerWeek", 0)
 
-            msg += f"""- Clan Score: {clan_trophies:,}
+            clan_section += f"""- Clan Score: {clan_trophies:,}
 - War Trophies: {clan_war_trophies:,}
 - Members: {members}/50
 - Required Trophies: {required_trophies:,}
 - Weekly Donations: {donations_per_week:,}
 """
 
+    # Comma-grouped counters, formatted in one pass
+    grouped = _fmt_ints(
+        trophies=get("trophies", 0),
+        best_trophies=get("bestTrophies", 0),
+        wins=wins,
+        losses=get("losses", 0),
+        battles=battles,
+        three_crown_wins=get("threeCrownWins", 0),
+        challenge_cards_won=get("challengeCardsWon", 0),
+        tournament_battle_count=get("tournamentBattleCount", 0),
+        tournament_cards_won=get("tournamentCardsWon", 0),
+        donations=get("donations", 0),
+        donations_received=get("donationsReceived", 0),
+        total_donations=get("totalDonations", 0),
+        war_day_wins=get("warDayWins", 0),
+        clan_cards_collected=get("clanCardsCollected", 0),
+    )
+
+    return PlayerView(
+        name=get("name", "Unknown"),
+        tag=get("tag", ""),
+        exp_level=get("expLevel", 0),
+        arena_name=get("arena", {}).get("name", "Unknown Arena"),
+        win_rate=(wins / battles * 100) if battles > 0 else 0,
+        challenge_max_wins=get("challengeMaxWins", 0),
+        cards_found=len(get("cards", [])),
+        deck_str=_deck_str(get("currentDeck", [])),
+        clan_section=clan_section,
+        **grouped,
+    )
+
+
+def format_player_info(view: PlayerView, chests: dict, monitored_stats: Optional[dict] = None) -> str:
+    """Format player information for display"""
+    fields = view._asdict()
+    fields["update_time"] = _now_utc_str()
+
+    parts = [_PLAYER_TEMPLATE.format_map(fields), view.clan_section]
+
     # Add upcoming chests
     upcoming = chests.get("items", [])
     if upcoming:
-        msg += f"""
-========================================
-Upcoming Chests:
-"""
-        for chest in upcoming[:12]:
+        parts.append(_CHESTS_HEADER)
+        for chest in islice(upcoming, 12):
             chest_name = chest.get("name", "Unknown Chest")
             index = chest.get("index", 0)
-            msg += f"  +{index}: {chest_name}\n"
+            parts.append(f"  +{index}: {chest_name}\n")
 
     # Add monitored stats if available
     if monitored_stats and monitored_stats.get("total", {}).get("total", 0) > 0:
-        msg += f"""
-========================================
-MONITORED SESSION STATS:
-"""
         total = monitored_stats["total"]
-        msg += f"Total: {total['wins']}W / {total['losses']}L / {total['draws']}D ({total['total']} games)\n"
-        msg += f"Session Win Rate: {total['win_rate']}%\n"
+        parts.append(f"""
+{_SEP}
+MONITORED SESSION STATS:
+Total: {total['wins']}W / {total['losses']}L / {total['draws']}D ({total['total']} games)
+Session Win Rate: {calculate_win_rate(total)}%
+""")
 
         if monitored_stats.get("by_mode"):
-            msg += "\nBy Game Mode:\n"
-            sorted_modes = sorted(
-                monitored_stats["by_mode"].items(),
-                key=lambda x: x[1]["total"],
-                reverse=True
-            )
-            for mode, mode_stats in sorted_modes[:5]:  # Top 5 modes
-                msg += f"  {mode}: {mode_stats['wins']}W/{mode_stats['losses']}L ({mode_stats['win_rate']}%)\n"
+            parts.append("\nBy Game Mode:\n")
+            top_modes = heapq.nlargest(5, monitored_stats["by_mode"].items(), key=_total_of)
+            for mode, mode_stats in top_modes:  # Top 5 modes
+                parts.append(f"  {mode}: {mode_stats['wins']}W/{mode_stats['losses']}L ({calculate_win_rate(mode_stats)}%)\n")
 
-    return msg
+    return "".join(parts)
 
 
 def format_battle(battle: dict) -> str:
@@ -161,60 +250,43 @@ def format_battle(battle: dict) -> str:
     battle_time = battle.get("battleTime", "")
 
     # Parse battle time
-    if battle_time:
-        try:
-            dt = datetime.strptime(battle_time, "%Y%m%dT%H%M%S.%fZ")
-            time_str = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
-        except:
-            time_str = battle_time
-    else:
-        time_str = "Unknown"
+    time_str = format_battle_time(battle_time) if battle_time else "Unknown"
 
     # Team info
     team = battle.get("team", [{}])[0]
-    team_name = team.get("name", "Unknown")
-    team_tag = team.get("tag", "")
-    team_crowns = team.get("crowns", 0)
-    team_trophies = team.get("startingTrophies", 0)
-    team_trophy_change = team.get("trophyChange", 0)
-    team_cards = team.get("cards", [])
+    team_get = team.get
+    team_name = team_get("name", "Unknown")
+    team_tag = team_get("tag", "")
+    team_crowns = team_get("crowns", 0)
+    team_trophies = team_get("startingTrophies", 0)
+    team_trophy_change = team_get("trophyChange", 0)
+    team_cards = team_get("cards", [])
 
     # Opponent info
     opponent = battle.get("opponent", [{}])[0]
-    opp_name = opponent.get("name", "Unknown")
-    opp_tag = opponent.get("tag", "")
-    opp_crowns = opponent.get("crowns", 0)
-    opp_trophies = opponent.get("startingTrophies", 0)
-    opp_cards = opponent.get("cards", [])
+    opp_get = opponent.get
+    opp_name = opp_get("name", "Unknown")
+    opp_tag = opp_get("tag", "")
+    opp_crowns = opp_get("crowns", 0)
+    opp_trophies = opp_get("startingTrophies", 0)
+    opp_cards = opp_get("cards", [])
 
     # Determine result
-    if team_crowns > opp_crowns:
-        result = "VICTORY"
-        result_emoji = "🏆"
-    elif team_crowns < opp_crowns:
-        result = "DEFEAT"
-        result_emoji = "💀"
-    else:
-        result = "DRAW"
-        result_emoji = "🤝"
+    result = _RESULT_LABELS[(team_crowns > opp_crowns) - (team_crowns < opp_crowns) + 1]
 
     # Format trophy change
-    trophy_str = ""
-    if team_trophy_change > 0:
-        trophy_str = f" (+{team_trophy_change})"
-    elif team_trophy_change < 0:
-        trophy_str = f" ({team_trophy_change})"
+    trophy_str = f" ({team_trophy_change:+d})" if team_trophy_change else ""
 
     # Format decks
-    team_deck = ", ".join([f"{c.get('name', '?')}" for c in team_cards[:8]])
-    opp_deck = ", ".join([f"{c.get('name', '?')}" for c in opp_cards[:8]])
+    team_deck = _deck_str(team_cards)
+    opp_deck = _deck_str(opp_cards)
 
     # Arena
     arena = battle.get("arena", {}).get("name", "Unknown Arena")
 
-    msg = f"""========================================
-{result_emoji} {result}{trophy_str}
-========================================
+    msg = f"""{_SEP}
+{result}{trophy_str}
+{_SEP}
 Mode: {game_mode}
 Arena: {arena}
 Time: {time_str}
@@ -241,63 +313,36 @@ def format_battle_short(battle: dict, player_tag: str) -> str:
     game_mode = battle.get("gameMode", {}).get("name", "Unknown Mode")
     battle_time = battle.get("battleTime", "")
 
-    if battle_time:
-        try:
-            dt = datetime.strptime(battle_time, "%Y%m%dT%H%M%S.%fZ")
-            time_str = dt.strftime("%Y-%m-%d %H:%M:%S UTC")
-        except:
-            time_str = battle_time
-    else:
-        time_str = "Unknown"
+    time_str = format_battle_time(battle_time) if battle_time else "Unknown"
 
     # Find the monitored player in team or opponent
     team = battle.get("team", [{}])
     opponent = battle.get("opponent", [{}])
 
-    player_data = None
-    enemy_data = None
-
-    for t in team:
-        if t.get("tag", "").upper() == player_tag.upper():
-            player_data = t
-            enemy_data = opponent[0] if opponent else {}
-            break
-
-    if not player_data:
-        for o in opponent:
-            if o.get("tag", "").upper() == player_tag.upper():
-                player_data = o
-                enemy_data = team[0] if team else {}
-                break
+    player_data, enemy_data = locate_player(team, opponent, player_tag.upper())
 
     if not player_data:
         player_data = team[0] if team else {}
         enemy_data = opponent[0] if opponent else {}
 
-    player_crowns = player_data.get("crowns", 0)
-    enemy_crowns = enemy_data.get("crowns", 0)
-    trophy_change = player_data.get("trophyChange", 0)
+    player_get = player_data.get
+    enemy_get = enemy_data.get
+
+    player_crowns = player_get("crowns", 0)
+    enemy_crowns = enemy_get("crowns", 0)
+    trophy_change = player_get("trophyChange", 0)
 
     # Determine result
-    if player_crowns > enemy_crowns:
-        result = "🏆 VICTORY"
-    elif player_crowns < enemy_crowns:
-        result = "💀 DEFEAT"
-    else:
-        result = "🤝 DRAW"
+    result = _RESULT_LABELS[(player_crowns > enemy_crowns) - (player_crowns < enemy_crowns) + 1]
 
-    trophy_str = ""
-    if trophy_change > 0:
-        trophy_str = f" (+{trophy_change})"
-    elif trophy_change < 0:
-        trophy_str = f" ({trophy_change})"
+    trophy_str = f" ({trophy_change:+d})" if trophy_change else ""
 
-    enemy_name = enemy_data.get("name", "Unknown")
-    enemy_tag = enemy_data.get("tag", "Unknown")
-    enemy_trophies = enemy_data.get("startingTrophies", 0)
+    enemy_name = enemy_get("name", "Unknown")
+    enemy_tag = enemy_get("tag", "Unknown")
+    enemy_trophies = enemy_get("startingTrophies", 0)
 
-    player_deck = [c.get("name", "?") for c in player_data.get("cards", [])[:8]]
-    enemy_deck = [c.get("name", "?") for c in enemy_data.get("cards", [])[:8]]
+    player_deck = _deck_str(player_get("cards", []))
+    enemy_deck = _deck_str(enemy_get("cards", []))
 
     msg = f"""Time: {time_str}
 
@@ -311,59 +356,57 @@ Tag: {enemy_tag}
 Trophies: {enemy_trophies:,}
 
 Your Deck:
-{', '.join(player_deck)}
+{player_deck}
 
 Enemy Deck:
-{', '.join(enemy_deck)}
+{enemy_deck}
 """
 
     return msg
 
 
+def _render_rival(i: int, rival: dict) -> str:
+    """Format one numbered entry of the rivals list"""
+    # Opponent stats from battle_logger always carry every field; only fall
+    # back to defaults for partial dicts
+    fields = rival if rival.keys() >= _RIVAL_DEFAULTS.keys() else ChainMap(rival, _RIVAL_DEFAULTS)
+    name, tag, total, wins, losses, draws = _RIVAL_FIELDS(fields)
+
+    # Show game modes if multiple; single-mode rivals skip the lookup entirely
+    modes_line = ""
+    by_mode = rival.get("by_mode")
+    if by_mode and len(by_mode) > 1:
+        top_modes = heapq.nlargest(3, by_mode.items(), key=_total_of)
+        modes_line = f"   Modes: {', '.join(map(_mode_entry, top_modes))}\n"
+
+    return _RIVAL_TEMPLATE.format(
+        i=i,
+        name=name,
+        tag=tag,
+        total=total,
+        wins=wins,
+        losses=losses,
+        draws=draws,
+        win_rate=calculate_win_rate(rival),
+        status=_RIVAL_STATUSES[(wins > losses) - (wins < losses) + 1],
+        modes_line=modes_line,
+    )
+
+
 def format_rivals_list(rivals: List[dict], player_name: str = "Player") -> str:
     """Format a list of repeat opponents (rivals)"""
     if not rivals:
         return f"No repeat opponents found for {player_name}.\nPlay more games to track rivalries!"
 
-    msg = f"""========================================
-RIVALS - Repeat Opponents for {player_name}
-========================================
-
-"""
-    for i, rival in enumerate(rivals[:15], 1):  # Top 15 rivals
-        name = rival.get("name", "Unknown")
-        tag = rival.get("tag", "")
-        total = rival.get("total", 0)
-        wins = rival.get("wins", 0)
-        losses = rival.get("losses", 0)
-        draws = rival.get("draws", 0)
-        win_rate = rival.get("win_rate", 0)
-
-        # Determine rivalry status
-        if wins > losses:
-            status = "Dominating"
-        elif losses > wins:
-            status = "Struggling"
-        else:
-            status = "Even"
-
-        msg += f"{i}. {name} ({tag})\n"
-        msg += f"   Matches: {total} | Record: {wins}W/{losses}L/{draws}D\n"
-        msg += f"   Win Rate: {win_rate}% | Status: {status}\n"
-
-        # Show game modes if multiple
-        by_mode = rival.get("by_mode", {})
-        if len(by_mode) > 1:
-            modes_str = ", ".join([f"{mode}: {stats['total']}" for mode, stats in sorted(by_mode.items(), key=lambda x: x[1]['total'], reverse=True)[:3]])
-            msg += f"   Modes: {modes_str}\n"
-
-        msg += "\n"
+    header = _RIVALS_HEADER.format(name=player_name)
+    body = "".join(_render_rival(i, rival) for i, rival in enumerate(islice(rivals, 15), 1))  # Top 15 rivals
 
+    footer = ""
     total_rivals = len(rivals)
     if total_rivals > 15:
-        msg += f"... and {total_rivals - 15} more rivals\n"
+        footer = f"... and {total_rivals - 15} more rivals\n"
 
-    return msg
+    return "".join((header, body, footer))
 
 
 def format_opponent_detail(opponent: dict) -> str:
@@ -377,11 +420,11 @@ def format_opponent_detail(opponent: dict) -> str:
     wins = opponent.get("wins", 0)
     losses = opponent.get("losses", 0)
     draws = opponent.get("draws", 0)
-    win_rate = opponent.get("win_rate", 0)
+    win_rate = calculate_win_rate(opponent)
 
-    msg = f"""========================================
+    parts = [f"""{_SEP}
 HEAD-TO-HEAD: vs {name}
-========================================
+{_SEP}
 
 Opponent Tag: {tag}
 Total Matches: {total}
@@ -389,28 +432,27 @@ Total Matches: {total}
 Record: {wins}W / {losses}L / {draws}D
 Win Rate: {win_rate}%
 
-"""
+"""]
 
     # Stats by game mode
     by_mode = opponent.get("by_mode", {})
     if by_mode:
-        msg += "BY GAME MODE:\n"
-        msg += "-" * 20 + "\n"
-        sorted_modes = sorted(by_mode.items(), key=lambda x: x[1]["total"], reverse=True)
+        parts.append(_MODES_HEADER)
+        sorted_modes = sorted(by_mode.items(), key=_total_of, reverse=True)
         for mode, stats in sorted_modes:
-            msg += f"\n{mode}:\n"
-            msg += f"  Record: {stats['wins']}W / {stats['losses']}L / {stats['draws']}D\n"
-            msg += f"  Games: {stats['total']} | Win Rate: {stats['win_rate']}%\n"
+            parts.append(
+                f"\n{mode}:\n"
+                f"  Record: {stats['wins']}W / {stats['losses']}L / {stats['draws']}D\n"
+                f"  Games: {stats['total']} | Win Rate: {calculate_win_rate(stats)}%\n"
+            )
 
     # Match history (last 10)
     battles = opponent.get("battles", [])
     if battles:
-        msg += "\n" + "=" * 40 + "\n"
-        msg += "RECENT MATCH HISTORY:\n"
-        msg += "-" * 20 + "\n"
+        parts.append(_HISTORY_HEADER)
 
         # Show last 10 matches (most recent first)
-        for battle in reversed(battles[-10:]):
+        for battle in battles[:-11:-1]:
             result = battle.get("result", "unknown")
             if result == "win":
                 result_icon = "W"
@@ -424,9 +466,9 @@ Win Rate: {win_rate}%
             player_crowns = battle.get("player_crowns", 0)
             enemy_crowns = battle.get("enemy_crowns", 0)
 
-            msg += f"[{result_icon}] {player_crowns}-{enemy_crowns} | {mode} | {time_str}\n"
+            parts.append(f"[{result_icon}] {player_crowns}-{enemy_crowns} | {mode} | {time_str}\n")
 
-    return msg
+    return "".join(parts)
 
 
 def format_repeat_opponent_alert(opponent: dict, is_new_battle: bool = True) -> str:
@@ -435,7 +477,7 @@ def format_repeat_opponent_alert(opponent: dict, is_new_battle: bool = True) ->
     total = opponent.get("total", 0)
     wins = opponent.get("wins", 0)
     losses = opponent.get("losses", 0)
-    win_rate = opponent.get("win_rate", 0)
+    win_rate = calculate_win_rate(opponent)
 
     if is_new_battle:
         # This is shown BEFORE the current battle result is recorded